@@ -0,0 +1,886 @@
+import os
+import io
+import exifread
+import pymediainfo
+import datetime
+import threading
+import queue
+import collections
+import heapq
+import concurrent.futures
+import multiprocessing
+from PIL import Image
+from pillow_heif import register_heif_opener
+import re
+import mmap
+import struct
+import sqlite3
+import subprocess
+import shutil
+from typing import NamedTuple, Optional
+try:
+    import orjson as json  # optional, parses the exiftool output several times faster
+except ImportError:
+    import json
+
+register_heif_opener()  # lets Image.open read .heic when the meta box can't be parsed directly
+
+# CPUs this process may run on, process_cpu_count (Python 3.13+) also respects the affinity mask
+USABLE_CPUS = (os.process_cpu_count() if hasattr(os, 'process_cpu_count') else os.cpu_count()) or 1
+
+# supported file extensions, grouped by the extractor that reads their date
+IMG_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.arw', '.nef', '.tiff', '.webp', '.bmp', '.cr2', '.orf', '.rw2', '.rwl', '.srw'})
+HEIC_EXTS = frozenset({'.heic'})
+VID_EXTS = frozenset({'.mov', '.mp4'})
+SUPPORTED_EXTS = IMG_EXTS | HEIC_EXTS | VID_EXTS
+# image formats whose EXIF block Pillow reads itself, raw formats stay with exifread, and so does PNG
+# since Pillow decodes the whole image looking for an eXIf chunk after the image data when there is none before it
+PIL_EXIF_EXTS = frozenset({'.jpg', '.jpeg', '.tiff', '.webp', '.bmp'})
+
+# EXIF tag ids used with Pillow's getexif()
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+# the APP1 EXIF segment of a JPEG sits right after the SOI marker, well within the first 64 KB
+JPEG_EXTS = frozenset({'.jpg', '.jpeg'})
+JPEG_HEADER_SIZE = 65536
+# bytes of a raw file handed to exifread first, the file itself is only parsed if the date lies further in
+RAW_HEADER_SIZE = 131072
+
+# function to get the APP1 EXIF payload from the header of a JPEG file, returns b'' if the JPEG has no EXIF
+# and None if the header couldn't be walked within the first 64 KB
+def _read_jpeg_exif(file_path):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 4:
+            return None
+        with mmap.mmap(f.fileno(), min(size, JPEG_HEADER_SIZE), access=mmap.ACCESS_READ) as mm:
+            if mm[0:2] != b'\xff\xd8':  # SOI
+                return None
+            offset = 2
+            while offset + 4 <= len(mm):
+                marker, length = struct.unpack_from('>HH', mm, offset)
+                if marker & 0xff00 != 0xff00:  # padding or broken segment, leave it to the full parse
+                    return None
+                if marker == 0xffda:  # start of scan, no more metadata segments follow
+                    return b''
+                if marker == 0xffe1 and mm[offset + 4:offset + 10] == b'Exif\x00\x00':
+                    end = offset + 2 + length
+                    return mm[offset + 4:end] if end <= len(mm) else None
+                offset += 2 + length
+    return None
+
+# function to read the date from a Pillow Exif object, DateTimeOriginal lives in the EXIF sub-IFD, DateTime in IFD0
+def _get_pillow_exif_date(exif):
+    date_str = exif.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if not date_str:
+        return None
+    return _parse_datetime(str(date_str).strip(), '%Y:%m:%d %H:%M:%S')
+
+# function to parse a fixed-width 'YYYY?MM?DD?HH?MM?SS' date by slicing, strptime interprets
+# its format string on every call and is only used for input that doesn't fit the layout
+def _parse_datetime(date_str, fmt):
+    try:
+        return datetime.datetime(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]),
+                                 int(date_str[11:13]), int(date_str[14:16]), int(date_str[17:19]))
+    except ValueError:
+        pass
+    try:
+        # shorter ISO 8601 forms like the XMP '2023-05-01T10:20' or '2023-05-01', keeping the wall time
+        return datetime.datetime.fromisoformat(date_str.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return datetime.datetime.strptime(date_str, fmt)
+
+# str.format fields for the numeric strftime directives, others are left to strftime
+FORMAT_FIELDS = {
+    '%Y': '{d.year:04d}', '%m': '{d.month:02d}', '%d': '{d.day:02d}',
+    '%H': '{d.hour:02d}', '%M': '{d.minute:02d}', '%S': '{d.second:02d}', '%%': '%',
+}
+
+# function to turn a format made of the numeric directives into a str.format template,
+# returns None if it uses anything else (names of months, weekdays, ...)
+def _compile_formatter(format_str):
+    parts = []
+    for part in re.split(r'(%.)', format_str):
+        if part.startswith('%'):
+            if part not in FORMAT_FIELDS:
+                return None
+            parts.append(FORMAT_FIELDS[part])
+        else:
+            parts.append(part.replace('{', '{{').replace('}', '}}'))
+    template = ''.join(parts)
+    return lambda d: template.format(d=d)
+
+# function to get the date formatter for a format string, the combobox formats and custom ones typed
+# by the user are compiled to a str.format template when possible and use strftime otherwise
+def get_formatter(format_str):
+    formatter = _compile_formatter(format_str)
+    if formatter is None:
+        formatter = lambda d: d.strftime(format_str)
+    return formatter
+
+# QuickTime/MP4 timestamps count seconds since 1904-01-01 UTC
+QUICKTIME_EPOCH = datetime.datetime(1904, 1, 1, tzinfo=datetime.timezone.utc)
+
+# function to find a box (atom) of the given type between offset and end of an ISO-BMFF file
+def _find_box(data, box_type, offset, end):
+    while offset + 8 <= end:
+        size, current_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:  # 64-bit size follows the type
+            if offset + 16 > end:
+                return None
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:  # box extends to the end of the file
+            size = end - offset
+        if size < header_size:
+            return None
+        if current_type == box_type:
+            return offset + header_size, min(offset + size, end)
+        offset += size
+    return None
+
+# the QuickTime metadata key iPhones write the recording date to, in the local time of the recording
+APPLE_CREATION_DATE_KEY = b'com.apple.quicktime.creationdate'
+
+# function to read com.apple.quicktime.creationdate from the keys and ilst boxes of moov/meta,
+# ilst holds one box per value, its type is the 1-based index of the key in keys
+def _read_apple_creation_date(mm, moov_start, moov_end):
+    meta = _find_box(mm, b'meta', moov_start, moov_end)
+    if meta is None:
+        return None
+    start, end = meta
+    if mm[start + 4:start + 8] != b'hdlr':  # the MP4 flavour of meta is a full box with version and flags
+        start += 4
+    keys = _find_box(mm, b'keys', start, end)
+    ilst = _find_box(mm, b'ilst', start, end)
+    if keys is None or ilst is None:
+        return None
+    entry_count = struct.unpack_from('>I', mm, keys[0] + 4)[0]
+    pos = keys[0] + 8
+    key_index = None
+    for index in range(1, entry_count + 1):
+        key_size = struct.unpack_from('>I', mm, pos)[0]
+        if key_size < 8 or pos + key_size > keys[1]:
+            return None
+        if mm[pos + 8:pos + key_size] == APPLE_CREATION_DATE_KEY:
+            key_index = index
+            break
+        pos += key_size
+    if key_index is None:
+        return None
+    item = _find_box(mm, struct.pack('>I', key_index), *ilst)
+    if item is None:
+        return None
+    data = _find_box(mm, b'data', *item)
+    if data is None:
+        return None
+    date_str = mm[data[0] + 8:data[1]].decode('utf-8', 'ignore')  # after the type and locale fields
+    try:
+        # the wall time of the recording, the UTC offset is dropped like for the mediainfo value
+        return _parse_datetime(date_str.replace('T', ' ').split('+')[0], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+# function to read the recording date of .mov and .mp4 files without a full mediainfo parse,
+# the Apple creation date if there is one, as mediainfo preferred it, else the creation time of the mvhd atom
+def _read_mp4_creation_date(file_path):
+    try:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            moov = _find_box(mm, b'moov', 0, len(mm))
+            if moov is None:
+                return None
+            apple_date = _read_apple_creation_date(mm, *moov)
+            if apple_date is not None:
+                return apple_date
+            mvhd = _find_box(mm, b'mvhd', *moov)
+            if mvhd is None:
+                return None
+            start = mvhd[0]
+            if mm[start] == 1:  # version 1 uses 64-bit times
+                creation_time = struct.unpack_from('>Q', mm, start + 4)[0]
+            else:
+                creation_time = struct.unpack_from('>I', mm, start + 4)[0]
+        if creation_time == 0:  # not set by the recording device
+            return None
+        # mvhd is stored in UTC, convert to local time like the mediainfo dates
+        return (QUICKTIME_EPOCH + datetime.timedelta(seconds=creation_time)).astimezone().replace(tzinfo=None)
+    except (OSError, ValueError, OverflowError, IndexError, struct.error):
+        return None
+
+# libmediainfo only needs to look at the container headers for the dates
+MEDIAINFO_PARSE_SPEED = 0.05
+_mediainfo_lock = threading.Lock()
+_mediainfo_available = None
+
+# function to check once whether libmediainfo can be loaded, instead of failing on every video
+def _can_parse_media():
+    global _mediainfo_available
+    with _mediainfo_lock:
+        if _mediainfo_available is None:
+            _mediainfo_available = pymediainfo.MediaInfo.can_parse()
+        return _mediainfo_available
+
+# date tags requested from exiftool, in the order they are preferred
+EXIFTOOL_DATE_TAGS = ('DateTimeOriginal', 'CreationDate', 'CreateDate', 'MediaCreateDate', 'ModifyDate')
+EXIFTOOL_BATCH_SIZE = 100  # paths per -execute, so the progress bar keeps moving
+# options sent with every batch, QuickTimeUTC converts the UTC video dates to local time like the built-in parser,
+# ModifyDate only as the EXIF (IFD0) tag, the QuickTime one is the last edit of the video,
+# -fast and not -fast2, which stops at the mdat atom of a video and the IDAT chunk of a PNG, and many files keep their dates after those
+EXIFTOOL_ARGS = ('-json', '-fast', '-charset', 'filename=utf8', '-api', 'QuickTimeUTC=1', '-EXIF:ModifyDate',
+                 *(f'-{tag}' for tag in EXIFTOOL_DATE_TAGS if tag != 'ModifyDate'))
+# exiftool reads a superset of the tags the built-in readers know, so a file it read without
+# finding a date isn't parsed again, set to False to let the built-in readers have a second look
+TRUST_EXIFTOOL = True
+
+# each exiftool is a Perl interpreter with its own memory, a few of them already saturate the disk
+EXIFTOOL_WORKERS = max(1, min(4, USABLE_CPUS))
+
+# one long-running exiftool process that reads the dates of many files per request
+class ExifToolProcess:
+    def __init__(self, exiftool_path):
+        self.sequence = 0
+        self.process = subprocess.Popen([exiftool_path, '-stay_open', 'True', '-@', '-'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+
+    # function to read the dates of a batch of files, returns path -> date (or None) for every file exiftool could read
+    def read_dates(self, paths):
+        paths = [path for path in paths if '\n' not in path]  # the argument file is line based
+        if not paths or self.process is None:
+            return {}
+        args = [*EXIFTOOL_ARGS, *paths]
+        # numbered requests, so output of an earlier request that was cut short can't be taken for this one
+        self.sequence += 1
+        request = ('\n'.join(args) + f'\n-execute{self.sequence}\n').encode('utf-8')
+        ready = f'{{ready{self.sequence}}}'.encode('ascii')
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+            output = []
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    raise OSError("exiftool exited")
+                if line.startswith(b'{ready'):
+                    if line.rstrip() == ready:
+                        break
+                    output = []
+                    continue
+                output.append(line)
+        except OSError:
+            self.process = None
+            return {}
+        try:
+            records = json.loads(b''.join(output)) if output else []
+        except ValueError:
+            return {}
+        found = {}
+        requested = set(paths)
+        normalized_dates = {}
+        parsed = {}  # the date tags of a file and the shots of a burst mostly share their values
+        for record in records:
+            if 'Error' in record:
+                continue  # exiftool couldn't read the file, leave it to the built-in readers
+            datetime_obj = None
+            for tag in EXIFTOOL_DATE_TAGS:
+                if tag not in record:
+                    continue
+                value = str(record[tag])
+                if value not in parsed:
+                    try:
+                        parsed[value] = _parse_datetime(value, '%Y:%m:%d %H:%M:%S')
+                    except ValueError:  # e.g. the '0000:00:00 00:00:00' of an unset date
+                        parsed[value] = None
+                datetime_obj = parsed[value]
+                if datetime_obj is not None:
+                    break
+            source_file = record.get('SourceFile', '')
+            if source_file in requested:
+                found[source_file] = datetime_obj
+            else:  # exiftool may echo the path with other separators
+                normalized_dates[os.path.normcase(os.path.normpath(source_file))] = datetime_obj
+        if normalized_dates:
+            for path in requested.difference(found):
+                key = os.path.normcase(os.path.normpath(path))
+                if key in normalized_dates:
+                    found[path] = normalized_dates[key]
+        return found
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(b'-stay_open\nFalse\n')
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+# a few exiftool processes that read batches side by side, none if exiftool isn't installed
+# and the built-in extractors are used instead
+class MetadataBatcher:
+    def __init__(self, workers=EXIFTOOL_WORKERS):
+        self.idle = queue.Queue()
+        self.workers = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        exiftool_path = shutil.which('exiftool')
+        if exiftool_path is None:
+            return
+        for _ in range(workers):
+            try:
+                self.idle.put(ExifToolProcess(exiftool_path))
+            except OSError:
+                break
+            self.workers += 1
+
+    # a process that died stays in the pool and answers with no dates, so a waiting caller never hangs,
+    # after close every call answers with no dates and the built-in readers take over
+    def read_dates(self, paths):
+        if self.workers == 0 or self.closed:
+            return {}
+        process = self.idle.get()
+        if process is None:  # woken up by close
+            self.idle.put(None)
+            return {}
+        try:
+            return process.read_dates(paths)
+        finally:
+            with self.lock:
+                if not self.closed:
+                    self.idle.put(process)
+                    process = None
+            if process is not None:
+                process.close()  # the pool was closed during this batch
+
+    # processes busy with a batch are closed when their batch returns, a None in the queue wakes the waiting callers
+    def close(self):
+        with self.lock:
+            self.closed = True
+            while True:
+                try:
+                    process = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+                if process is not None:
+                    process.close()
+            self.idle.put(None)
+
+# a file and the date extracted from it, as passed between the gather, plan and rename phases,
+# a tuple since there is one per file in the folder and none is changed after the gather
+class Item(NamedTuple):
+    src: str
+    name: str
+    dt: Optional[datetime.datetime]
+    ext: str
+
+# dates parsed in this session, path -> (mtime_ns, date), shared by the preview and the rename
+parse_cache = {}
+
+# location of the persistent date cache, kept out of the photo folders themselves
+CACHE_PATH = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'), 'EXIFrenameX', 'dates.sqlite')
+
+# persistent cache of extracted dates, keyed by path, size and mtime so changed files are parsed again
+class DateCache:
+    VERSION = 3  # bump when the extractors change what they return
+    QUERY_CHUNK = 500  # paths per IN query, older SQLite builds allow 999 parameters
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.lock = threading.Lock()
+        self.pending = []
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+            # WAL with synchronous=NORMAL commits without waiting for a sync of the whole database
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (version INTEGER)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS dates (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, date TEXT)")
+            row = self.connection.execute("SELECT version FROM meta").fetchone()
+            if row is None or row[0] != self.VERSION:
+                self.connection.execute("DELETE FROM dates")
+                self.connection.execute("DELETE FROM meta")
+                self.connection.execute("INSERT INTO meta VALUES (?)", (self.VERSION,))
+                self.connection.commit()
+        except (OSError, sqlite3.Error):
+            self.connection = None  # run without the cache
+
+    # function to get the cached dates of many entries with a few IN queries,
+    # returns path -> date for the entries whose size and mtime still match
+    def lookup_many(self, entries):
+        if self.connection is None or not entries:
+            return {}
+        stats = {os.path.abspath(entry.path): (entry.path, entry.stat()) for entry in entries}
+        keys = list(stats)
+        found = {}
+        try:
+            with self.lock:
+                for start in range(0, len(keys), self.QUERY_CHUNK):
+                    chunk = keys[start:start + self.QUERY_CHUNK]
+                    query = f"SELECT path, size, mtime_ns, date FROM dates WHERE path IN ({','.join('?' * len(chunk))})"
+                    for path, size, mtime_ns, date in self.connection.execute(query, chunk):
+                        entry_path, stat = stats[path]
+                        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                            found[entry_path] = datetime.datetime.fromisoformat(date) if date is not None else None
+        except sqlite3.Error:
+            return {}
+        return found
+
+    # new dates are written together by flush()
+    def store(self, entry, datetime_obj):
+        if self.connection is None:
+            return
+        stat = entry.stat()
+        with self.lock:
+            self.pending.append((os.path.abspath(entry.path), stat.st_size, stat.st_mtime_ns, datetime_obj.isoformat() if datetime_obj is not None else None))
+
+    def flush(self):
+        if self.connection is None:
+            return
+        with self.lock:
+            rows, self.pending = self.pending, []
+            try:
+                self.connection.executemany("INSERT OR REPLACE INTO dates VALUES (?, ?, ?, ?)", rows)
+            except sqlite3.Error:
+                pass
+
+    # keep the entry of a renamed file, a rename changes neither size nor mtime
+    def rename(self, old_path, new_path):
+        if self.connection is None:
+            return
+        if self.pending:
+            self.flush()
+        try:
+            with self.lock:
+                self.connection.execute("UPDATE OR REPLACE dates SET path = ? WHERE path = ?", (os.path.abspath(new_path), os.path.abspath(old_path)))
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.flush()
+        with self.lock:
+            try:
+                self.connection.commit()
+            except sqlite3.Error:
+                pass
+            self.connection.close()
+
+# function to extract date from exif tags of .jpeg, .jpg, .png, ... files
+def get_exif_date(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in JPEG_EXTS:
+        datetime_obj = get_jpeg_exif_date(file_path)
+        if datetime_obj is not False:
+            return datetime_obj
+    if extension in PIL_EXIF_EXTS:
+        try:
+            return get_pillow_exif_date(file_path)
+        except (OSError, SyntaxError):  # Pillow can't read the file, let exifread try
+            pass
+    with open(file_path, 'rb') as f:
+        # IFD0 (DateTime) is read before the EXIF sub-IFD, so stopping at DateTimeOriginal keeps both,
+        # details=False skips the MakerNote and thumbnail which are the bulk of raw files
+        # the tags of raw files sit in the first few KB, parse them from one contiguous read
+        header = f.read(RAW_HEADER_SIZE)
+        try:
+            tags = exifread.process_file(io.BytesIO(header), stop_tag='DateTimeOriginal', details=False)
+        except Exception:  # an offset points past the header
+            tags = {}
+        if len(header) == RAW_HEADER_SIZE:
+            # a date string stored past the header comes back empty, only a date that parses is taken from it
+            try:
+                datetime_obj = _get_exifread_date(tags) if 'EXIF DateTimeOriginal' in tags else None
+            except ValueError:
+                datetime_obj = None
+            if datetime_obj is not None:
+                return datetime_obj
+            f.seek(0)
+            tags = exifread.process_file(f, stop_tag='DateTimeOriginal', details=False)
+        #Optional:
+        #if 'file_creation_date' in tags:
+        #    date_str = str(tags['file_creation_date'])
+        #    return datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S.%f %Z')
+        return _get_exifread_date(tags)
+
+# function to read the date from exifread tags, DateTime is an IFD0 tag, exifread files it under 'Image',
+# the printable string is cached on the tag
+def _get_exifread_date(tags):
+    tag = tags.get('EXIF DateTimeOriginal') or tags.get('Image DateTime')
+    if tag is None:
+        return None
+    return _parse_datetime(tag.printable, '%Y:%m:%d %H:%M:%S')
+
+# function to extract date from exif tags with Pillow's C parser, only reads the EXIF block
+def get_pillow_exif_date(file_path):
+    with Image.open(file_path) as img:
+        return _get_pillow_exif_date(img.getexif())
+
+# function to extract date from the memory-mapped JPEG header without opening the image,
+
+# returns False if the header has to be left to the full parse
+def get_jpeg_exif_date(file_path):
+    try:
+        payload = _read_jpeg_exif(file_path)
+        if payload is None:
+            return False
+        if not payload:
+            return None
+        exif = Image.Exif()
+        exif.load(payload)
+    except (OSError, ValueError, SyntaxError, struct.error):
+        return False
+    return _get_pillow_exif_date(exif)
+
+# function to extract date from metadata of .mov and .mp4 files
+def get_media_date(file_path):
+    datetime_obj = _read_mp4_creation_date(file_path)
+    if datetime_obj is not None:
+        return datetime_obj
+    if not _can_parse_media():
+        return None
+    media_info = pymediainfo.MediaInfo.parse(file_path, parse_speed=MEDIAINFO_PARSE_SPEED)
+    for track in media_info.tracks:
+        data = track.to_data()  # builds a new dict on every call
+        if 'comapplequicktimecreationdate' in data:
+            date_str = data['comapplequicktimecreationdate']
+            date_str = date_str.replace('T', ' ').split('+')[0]
+            return _parse_datetime(date_str, '%Y-%m-%d %H:%M:%S')
+        elif 'recorded_date' in data:
+            date_str = data['recorded_date']
+            date_str = date_str.replace('T', ' ').split('+')[0]
+            return _parse_datetime(date_str, '%Y-%m-%d %H:%M:%S')
+        elif 'encoded_date' in data:
+            date_str = data['encoded_date']
+            try:
+                return _parse_datetime(date_str.replace('UTC', '').strip(), '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                pass  # Try other formats or handle the error as needed
+    return None  # Return None if no valid date is found
+
+# xmp:CreateDate as attribute or element, searched in the raw XMP bytes without decoding the packet
+XMP_CREATE_DATE_RE = re.compile(rb'xmp:CreateDate(?:="|>)([^"<]+)')
+
+# function to read a big-endian unsigned integer of size bytes, size 0 (an absent field) reads as 0
+def _read_uint(data, offset, size):
+    return int.from_bytes(data[offset:offset + size], 'big')
+
+# function to read the XMP packet of a .heic file straight from its meta box without decoding the image:
+# iinf names the 'mime' item holding application/rdf+xml, iloc says where its bytes are,
+# returns b'' if every item was listed and none is XMP, and None for a layout this parser doesn't know
+def _read_heic_xmp(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                meta = _find_box(mm, b'meta', 0, size)
+                if meta is None:
+                    return None
+                meta_start, meta_end = meta[0] + 4, meta[1]  # meta is a full box, skip version and flags
+                iinf = _find_box(mm, b'iinf', meta_start, meta_end)
+                iloc = _find_box(mm, b'iloc', meta_start, meta_end)
+                if iinf is None or iloc is None:
+                    return None
+
+                xmp_item = None
+                old_infe = False  # version 0/1 entries name no item type, their content isn't checked here
+                offset = iinf[0] + 4 + (2 if mm[iinf[0]] == 0 else 4)
+                while xmp_item is None:
+                    infe = _find_box(mm, b'infe', offset, iinf[1])
+                    if infe is None:
+                        return None if old_infe else b''
+                    pos, offset = infe
+                    version = mm[pos]
+                    if version < 2:
+                        old_infe = True
+                    else:
+                        id_size = 2 if version == 2 else 4
+                        item_type = mm[pos + 6 + id_size:pos + 10 + id_size]
+                        if item_type == b'mime':
+                            name_end = mm.find(b'\0', pos + 10 + id_size, offset)
+                            content_type_end = mm.find(b'\0', name_end + 1, offset)
+                            if name_end >= 0 and mm[name_end + 1:content_type_end] == b'application/rdf+xml':
+                                xmp_item = _read_uint(mm, pos + 4, id_size)
+
+                pos = iloc[0]
+                version = mm[pos]
+                offset_size, length_size = mm[pos + 4] >> 4, mm[pos + 4] & 15
+                base_offset_size = mm[pos + 5] >> 4
+                index_size = mm[pos + 5] & 15 if version in (1, 2) else 0
+                count_size = 2 if version < 2 else 4
+                item_count = _read_uint(mm, pos + 6, count_size)
+                pos += 6 + count_size
+                for _ in range(item_count):
+                    # _read_uint reads past the end as 0, so a corrupt item or extent count is caught here
+                    if pos >= iloc[1]:
+                        return None
+                    item_id = _read_uint(mm, pos, count_size)
+                    pos += count_size
+                    construction_method = 0
+                    if version in (1, 2):
+                        construction_method = _read_uint(mm, pos, 2) & 15
+                        pos += 2
+                    pos += 2  # data_reference_index
+                    base_offset = _read_uint(mm, pos, base_offset_size)
+                    pos += base_offset_size
+                    extent_count = _read_uint(mm, pos, 2)
+                    pos += 2
+                    extents = []
+                    for _ in range(extent_count):
+                        if pos >= iloc[1]:
+                            return None
+                        pos += index_size
+                        extent_offset = _read_uint(mm, pos, offset_size)
+                        extent_length = _read_uint(mm, pos + offset_size, length_size)
+                        pos += offset_size + length_size
+                        extents.append((base_offset + extent_offset, extent_length))
+                    if item_id != xmp_item:
+                        continue
+                    if construction_method == 1:  # offsets into the idat box of meta
+                        idat = _find_box(mm, b'idat', meta_start, meta_end)
+                        if idat is None:
+                            return None
+                        extents = [(idat[0] + extent_offset, extent_length) for extent_offset, extent_length in extents]
+                    elif construction_method != 0:
+                        return None
+                    return b''.join(mm[extent_offset:extent_offset + extent_length] for extent_offset, extent_length in extents)
+                return None
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+# function to read the xmp:CreateDate of an XMP packet
+def _get_xmp_create_date(xmp_data):
+    create_date_match = XMP_CREATE_DATE_RE.search(xmp_data)
+    if create_date_match:
+        create_date = create_date_match.group(1).decode('ascii', 'ignore')
+        try:
+            date_object = _parse_datetime(create_date, '%Y-%m-%dT%H:%M:%S')
+            return date_object
+        except ValueError as e:
+            print("Error converting date:", e)
+    return None
+
+def get_heic_exif_date(file_path):
+    xmp_data = _read_heic_xmp(file_path)
+    if xmp_data is not None:  # b'' for a file without XMP, no need to ask Pillow then
+        return _get_xmp_create_date(xmp_data)
+
+    # Pillow (through pillow-heif) for layouts the box parser doesn't handle
+    with open(file_path, 'rb') as f:
+        img = Image.open(f)
+        metadata = img.info
+        for key, value in metadata.items():
+            if key == 'xmp':
+                if value is not None:  # Check if value is not None
+                    return _get_xmp_create_date(value)
+        img.close()  # Close the image object to release associated resources
+
+    # Return None if no CreateDate metadata was found or if value is None
+    return None
+
+# function to pick the date extractor based on the file extension
+def extract_date(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in IMG_EXTS:
+        return get_exif_date(file_path)
+    elif extension in HEIC_EXTS:
+        return get_heic_exif_date(file_path)
+    elif extension in VID_EXTS:
+        return get_media_date(file_path)
+    else:
+        return None
+
+# function to extract the dates of several files in one task, in the order of the paths
+def extract_dates(paths):
+    return [extract_date(path) for path in paths]
+
+# function to list the files of a folder, the folder's mtime is read before the listing
+# so adding, removing or renaming a file afterwards always makes it differ
+def scan_folder(folder_path):
+    folder_mtime = os.stat(folder_path).st_mtime_ns
+    with os.scandir(folder_path) as it:
+        entries = [entry for entry in it if entry.is_file()]
+    return folder_mtime, entries
+
+# uncached files from which on the built-in readers run in worker processes instead of threads
+PROCESS_POOL_MIN_FILES = 200
+# most files sent to a worker process per task, each task pickles its paths and dates across the process boundary
+PROCESS_CHUNK_SIZE = 32
+# uncached files per worker process, a spawned process imports the readers first, so small batches start fewer of them
+PROCESS_FILES_PER_WORKER = 100
+
+# phase 1: extract the dates of all entries concurrently, the parsers mostly wait on file I/O,
+# with a running exiftool the files go to it in batches and only what it can't read is parsed here,
+# once stop_event is set the files not read yet are skipped and stay undated
+def gather_dates(entries, date_cache, progress_callback=None, batcher=None, stop_event=None):
+    dates = [None] * len(entries)  # indexed like entries, filled in as the dates come in
+    exts = [os.path.splitext(entry.name)[1].lower() for entry in entries]  # split once, reused for the items
+    pending = []
+    for index, entry in enumerate(entries):
+        if exts[index] not in SUPPORTED_EXTS:
+            continue  # no extractor for it, skip the stat and the caches
+        cached = parse_cache.get(entry.path)
+        if cached is not None and cached[0] == entry.stat().st_mtime_ns:
+            dates[index] = cached[1]
+        else:
+            pending.append(index)
+    done = len(entries) - len(pending)
+    if progress_callback is not None and done > 0:
+        progress_callback(done)
+
+    def record(index, datetime_obj):
+        nonlocal done
+        dates[index] = datetime_obj
+        parse_cache[entries[index].path] = (entries[index].stat().st_mtime_ns, datetime_obj)
+        done += 1
+        if progress_callback is not None:
+            progress_callback(done)
+
+    # function to check for a stop, the queued batches are dropped and the running ones finish
+    def stopped(futures):
+        if stop_event is None or not stop_event.is_set():
+            return False
+        for future in futures:
+            future.cancel()
+        return True
+
+    cached = date_cache.lookup_many([entries[index] for index in pending])
+    misses = []
+    for index in pending:
+        if entries[index].path in cached:
+            record(index, cached[entries[index].path])
+        else:
+            misses.append(index)
+    pending = misses
+
+    if batcher is not None and batcher.workers > 0:
+        batches = [pending[start:start + EXIFTOOL_BATCH_SIZE] for start in range(0, len(pending), EXIFTOOL_BATCH_SIZE)]
+        pending = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=batcher.workers) as executor:
+            futures = {executor.submit(batcher.read_dates, [entries[index].path for index in batch]): batch for batch in batches}
+            for future in concurrent.futures.as_completed(futures):
+                if stopped(futures):
+                    pending = []
+                    break
+                found = future.result()
+                for index in futures[future]:
+                    path = entries[index].path
+                    if path not in found or (found[path] is None and not TRUST_EXIFTOOL):
+                        pending.append(index)
+                    else:
+                        date_cache.store(entries[index], found[path])
+                        record(index, found[path])
+
+    # the pure-Python parsers hold the GIL, so a large batch is worth starting worker processes for,
+    # spawned since a forked copy of the Tk process and its threads isn't safe to run
+    # the files go to a process in chunks, still leaving a few tasks per process so they all stay busy,
+    # no more processes or threads are started than the batch can keep busy
+    if len(pending) >= PROCESS_POOL_MIN_FILES and USABLE_CPUS > 1:
+        workers = min(USABLE_CPUS, max(2, len(pending) // PROCESS_FILES_PER_WORKER))
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        chunk_size = max(1, min(PROCESS_CHUNK_SIZE, len(pending) // (workers * 4)))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(32, USABLE_CPUS * 4, len(pending))))
+        chunk_size = 1
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    with executor:
+        futures = {executor.submit(extract_dates, [entries[index].path for index in chunk]): chunk for chunk in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            if stopped(futures):
+                break
+            for index, datetime_obj in zip(futures[future], future.result()):
+                date_cache.store(entries[index], datetime_obj)
+                record(index, datetime_obj)
+    return [Item(entry.path, entry.name, datetime_obj, ext) for entry, datetime_obj, ext in zip(entries, dates, exts)]
+
+# function to check whether a file name is base_name with a numbered suffix as plan_renames gives it, like 'X_3.jpg'
+def _is_numbered_name(name, base_name, ext):
+    if not name.startswith(base_name + '_') or not name.endswith(ext):
+        return False
+    number = name[len(base_name) + 1:len(name) - len(ext)]
+    return number.isascii() and number.isdigit() and not number.startswith('0')
+
+# phase 2: assign the new names, sorted by date so the numbering of equal names doesn't depend on parse order,
+# a name only depends on the files before it, so with a limit only the first limit files are sorted and named
+def plan_renames(items, settings, limit=None, taken_names=None):
+    plan = []
+    # the current names count as taken so a rename never replaces another file
+    used_names = set(get_taken_names(items) if taken_names is None else taken_names)
+    suffix_counter = collections.defaultdict(int)
+    dated_items = (item for item in items if item.dt is not None)
+    sort_key = lambda item: (item.dt, item.src)
+    if limit is None:
+        dated_items = sorted(dated_items, key=sort_key)
+    else:
+        dated_items = heapq.nsmallest(limit, dated_items, key=sort_key)
+    for item in dated_items:
+        base_name = get_formatted_date(item.dt, item.name, settings)
+        new_name = base_name + item.ext
+        used_names.discard(item.name.lower())  # the file may keep its own name
+        # a file numbered by an earlier run keeps its number, no file before it can have taken its current name,
+        # so renaming an already renamed folder again changes nothing
+        if new_name.lower() in used_names and _is_numbered_name(item.name, base_name, item.ext):
+            new_name = item.name
+        while new_name.lower() in used_names:
+            suffix_counter[base_name] += 1
+            new_name = f"{base_name}_{suffix_counter[base_name]}{item.ext}"
+        used_names.add(new_name.lower())
+        plan.append((item, new_name))
+    return plan
+
+# function to get the current names of the files, compared in lower case since Windows file names are case-insensitive,
+# the set only changes with the folder so callers planning the same items again can pass it back to plan_renames
+def get_taken_names(items):
+    return frozenset(item.name.lower() for item in items)
+
+# function to build the new base name, settings is (formatter, prefix, suffix, merge option)
+def get_formatted_date(datetime_obj, filename, settings):
+    formatter, prefix, suffix, radio_option = settings
+    base_name = os.path.splitext(filename)[0]
+
+    if radio_option == 0:  # New
+        return f"{prefix}{formatter(datetime_obj)}{suffix}"
+    elif radio_option == 1:  # New + Original
+        return f"{prefix}{formatter(datetime_obj)}_{base_name}{suffix}"
+    elif radio_option == 2:  # Original
+        return f"{prefix}{base_name}{suffix}"
+    elif radio_option == 3:  # Original + New
+        return f"{prefix}{base_name}_{formatter(datetime_obj)}{suffix}"
+    else:
+        return None
+
+# phase 3: execute the planned renames, returns the names the renamed files ended up with
+# the plan is unique against every file in the folder at scan time, a file created since then
+# gets the next free suffix instead of being replaced by os.replace, once stop_event is set the remaining files keep their names
+def run_renames(plan, date_cache, stop_event=None):
+    renamed_files = []
+    planned_names = {new_name.lower() for _, new_name in plan}
+    for item, new_name in plan:
+        if stop_event is not None and stop_event.is_set():
+            break
+        if new_name != item.name:
+            folder_path = os.path.dirname(item.src)
+            dst = os.path.join(folder_path, new_name)
+            if new_name.lower() != item.name.lower() and os.path.lexists(dst):
+                base_name, ext = os.path.splitext(new_name)
+                counter = 0
+                while os.path.lexists(dst) or new_name.lower() in planned_names:
+                    counter += 1
+                    new_name = f"{base_name}_{counter}{ext}"
+                    dst = os.path.join(folder_path, new_name)
+                planned_names.add(new_name.lower())
+            os.replace(item.src, dst)
+            date_cache.rename(item.src, dst)
+            # a single pop, the Tk thread may clear the cache for a newly picked folder at any time
+            cached = parse_cache.pop(item.src, None)
+            if cached is not None:
+                parse_cache[dst] = cached
+        renamed_files.append(new_name)
+    return renamed_files
@@ -0,0 +1,441 @@
+import os
+import tkinter
+import tkinter.filedialog
+import tkinter.messagebox
+import customtkinter
+import threading
+import concurrent.futures
+import queue
+import time
+from exifrenamex_core import DateCache, MetadataBatcher, scan_folder, gather_dates, plan_renames, run_renames, get_formatter, get_taken_names, parse_cache
+
+customtkinter.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
+customtkinter.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
+
+# file names listed per section of the rename report, the text widget lays out every line it holds
+REPORT_NAME_LIMIT = 1000
+# pause in typing after which the prefix/suffix fields re-plan the preview
+NAMING_DEBOUNCE_MS = 250
+# seconds a stat of the preview folder is reused, naming changes check the folder on the Tk thread
+FOLDER_STAT_TTL = 0.5
+# scans, preview plans and renames that can run at once, the threads are kept between tasks
+BACKGROUND_WORKERS = 4
+
+class app(customtkinter.CTk):
+    def __init__(self):
+        super().__init__()
+
+        # dates of the previewed folder, reused while only the naming options change
+        self.preview_folder = None
+        self.preview_folder_mtime = None
+        self.preview_items = None
+        self.preview_taken_names = None
+        # (path, time, stat result or None) of the last look at the preview folder
+        self.folder_stat_cache = None
+        # text last written to the preview box, an unchanged preview isn't redrawn
+        self.preview_text = None
+        # naming options the preview was planned with, and the pending debounced re-plan
+        self.preview_naming_key = None
+        self.naming_update_job = None
+        # bumped for every scan or re-plan of the preview, results of older ones are dropped
+        self.preview_seq = 0
+        # (folder, cancel event) of the preview scan in progress, a newer scan sets the event of the one it replaces
+        self.preview_scan = None
+
+        # configure window
+        self.title("EXIFrenameX")
+        self.geometry(f"{1100}x{580}")
+
+        # configure grid layout
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_columnconfigure((2, 3), weight=0)
+        self.grid_rowconfigure((0, 1, 2), weight=1)
+
+        # create GUI
+        self.sidebar_frame = customtkinter.CTkFrame(self, width=140, corner_radius=0)
+        self.sidebar_frame.grid(row=0, column=0, rowspan=4, sticky="nsew")
+        self.sidebar_frame.grid_rowconfigure(4, weight=1)
+        self.logo_label = customtkinter.CTkLabel(self.sidebar_frame, text="EXIFrenameX", font=customtkinter.CTkFont(size=20, weight="bold"))
+        self.logo_label.grid(row=0, column=0, padx=20, pady=(20, 10))
+        self.sidebar_button_1 = customtkinter.CTkButton(self.sidebar_frame, command=self.sidebar_button_event)
+        self.sidebar_button_1.grid(row=1, column=0, padx=20, pady=10)
+        self.sidebar_button_1.configure(text="Rename Files", command=self.on_sidebar_button_1_click)
+        #self.sidebar_button_1.bind("<ButtonRelease-1>", lambda _: self.update_preview())
+        self.appearance_mode_optionemenu = customtkinter.CTkOptionMenu(self.sidebar_frame, values=["Light", "Dark", "System"], command=self.change_appearance_mode_event)
+        self.appearance_mode_optionemenu.grid(row=7, column=0, padx=20, pady=(10, 10))
+        self.scaling_optionemenu = customtkinter.CTkOptionMenu(self.sidebar_frame, values=["80%", "90%", "100%", "110%", "120%"], command=self.change_scaling_event)
+        self.scaling_optionemenu.grid(row=8, column=0, padx=20, pady=(10, 20))
+        self.entry = customtkinter.CTkEntry(self, placeholder_text="Brows File Pfad")
+        self.entry.grid(row=3, column=1, columnspan=2, padx=(20, 0), pady=(20, 20), sticky="nsew")
+        self.main_button_1 = customtkinter.CTkButton(master=self, fg_color="transparent", border_width=2, text_color=("gray10", "#DCE4EE"), text="Browse", command=self.browse_directory)
+        self.main_button_1.grid(row=3, column=3, padx=(20, 20), pady=(20, 20), sticky="nsew")
+        self.textbox_1 = customtkinter.CTkTextbox(self, width=250)
+        self.textbox_1.grid(row=0, column=1, padx=(20, 0), pady=(20, 0), sticky="nsew")
+        self.format_frame = customtkinter.CTkFrame(self, width=250)
+        self.format_frame.grid(row=0, column=2, padx=(20, 0), pady=(20, 0), sticky="nsew")
+        self.select_format_label = customtkinter.CTkLabel(self.format_frame, text="Select Format")
+        self.select_format_label.grid(row=0, column=0, padx=20, pady=(10, 10), sticky="w")
+        self.combobox_1 = customtkinter.CTkComboBox(self.format_frame, values=["%Y-%m-%d_%H-%M-%S", "%Y%m%d_%H%M%S", "%d-%m-%Y_%Hh%Mm%Ss"], width=240, command=lambda _: self.run_naming_update())
+        self.combobox_1.grid(row=1, column=0, padx=20, pady=(10, 10))
+        #self.combobox_1.bind("<<ComboboxSelected>>", lambda _: self.update_preview())
+        self.entry_2 = customtkinter.CTkEntry(self.format_frame, width=240, placeholder_text="Enter Prefix here")
+        self.entry_2.grid(row=2, column=0, padx=20, pady=(10, 10))
+        self.entry_2.bind("<KeyRelease>", lambda _: self.schedule_naming_update())
+        self.entry_3 = customtkinter.CTkEntry(self.format_frame, width=240, placeholder_text="Enter Suffix here")
+        self.entry_3.grid(row=3, column=0, padx=20, pady=(10, 10))
+        self.entry_3.bind("<KeyRelease>", lambda _: self.schedule_naming_update())
+        self.update_button = customtkinter.CTkButton(self.format_frame, text="Update Preview", command=self.update_preview)
+        self.update_button.grid(row=4, column=0, padx=20, pady=(10, 10), sticky="nsew")
+        self.radiobutton_frame = customtkinter.CTkFrame(self)
+        self.radiobutton_frame.grid(row=0, column=3, padx=(20, 20), pady=(20, 0), sticky="nsew")
+        self.radio_var = tkinter.IntVar(value=0)
+        self.label_radio_group = customtkinter.CTkLabel(master=self.radiobutton_frame, text="Select merge:")
+        self.label_radio_group.grid(row=0, column=2, columnspan=1, padx=10, pady=10, sticky="w")
+        self.radio_button_1 = customtkinter.CTkRadioButton(master=self.radiobutton_frame, variable=self.radio_var, value=0)
+        self.radio_button_1.grid(row=1, column=2, pady=10, padx=20, sticky="w")
+        self.radio_button_2 = customtkinter.CTkRadioButton(master=self.radiobutton_frame, variable=self.radio_var, value=1)
+        self.radio_button_2.grid(row=2, column=2, pady=10, padx=20, sticky="w")
+        self.radio_button_3 = customtkinter.CTkRadioButton(master=self.radiobutton_frame, variable=self.radio_var, value=2)
+        self.radio_button_3.grid(row=3, column=2, pady=10, padx=20, sticky="w")
+        self.radio_button_4 = customtkinter.CTkRadioButton(master=self.radiobutton_frame, variable=self.radio_var, value=3)
+        self.radio_button_4.grid(row=4, column=2, pady=10, padx=20, sticky="w")
+        self.textbox_2 = customtkinter.CTkTextbox(self, width=250)
+        self.textbox_2.grid(row=1, column=1, padx=(20, 0), pady=(20, 0), sticky="nsew")
+        self.textbox_3 = customtkinter.CTkTextbox(self, width=250)
+        self.textbox_3.grid(row=1, column=2, columnspan=2, padx=(20, 20), pady=(20, 0), sticky="nsew")
+
+        # set default values
+        self.sidebar_button_1.configure(text="Rename Files")
+        self.radio_button_1.configure(text="New")
+        self.radio_button_1.select()
+        self.radio_button_2.configure(text="New + Orginal")
+        self.radio_button_3.configure(text="Orginal")
+        self.radio_button_4.configure(text="Orginal + New")
+        self.appearance_mode_optionemenu.set("Dark")
+        self.scaling_optionemenu.set("100%")
+        # the mode and scaling currently applied, re-applying either restyles every widget
+        self.appearance_mode = "System"
+        self.widget_scaling = 1.0
+        self.textbox_1.insert("0.0", "Format explanation\n\n"
+                                    "- Format 1: %Y-%m-%d_%H-%M-%S\n"
+                                    "- Example: 2023-04-13_14-30-15\n\n"
+                                    "- Format 2: %Y%m%d_%H%M%S\n"
+                                    "- Example: 20230413_143015\n\n"
+                                    "- Format 3: %d-%m-%Y_%Hh%Mm%Ss\n"
+                                    "- Example: 13-04-2023_14h30m15s\n\n"
+                                    "Placeholders:\n"
+                                    "- %Y: year (e.g., 2023)\n"
+                                    "- %m: month (e.g., 01)\n"
+                                    "- %d: day (e.g., 31)\n"
+                                    "- %H: hour (00-23)\n"
+                                    "- %M: minute (00-59)\n"
+                                    "- %S: second (00-59)\n\n"
+                                    "Other options:\n"
+                                    "- %y: 2-digit year\n"
+                                    "- %b, %B: abbreviated/full month name\n"
+                                    "- %a, %A: abbreviated/full weekday name\n"
+                                    "- %I: hour (01-12)\n"
+                                    "- %p: AM/PM\n"
+                                    "- %j: day of the year\n"
+                                    "- %U, %W: week number (Sun/Mon first)\n"
+                                    "- %Z, %z: time zone name/offset\n\n"
+                                    "Combine symbols to create custom formats.")
+
+        self.textbox_2.insert("0.0", "File processing: \n")
+        self.set_preview_text("Preview of Files (0-49):\n\n")
+        # traced only now, radio_button_1.select() above would re-plan the preview before it has its first text
+        self.radio_var.trace_add('write', lambda *args, **kwargs: self.run_naming_update())
+
+        # widget updates from worker threads are queued and applied on the Tk main thread
+        self.ui_queue = queue.Queue()
+        self.after(100, self.drain_ui_queue)
+        # started once and shared by the preview and the rename
+        self.metadata_batcher = MetadataBatcher()
+        self.background_executor = concurrent.futures.ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="exifrenamex")
+        # set when the window closes, the running scans and renames stop at the next file so the app can exit
+        self.stop_event = threading.Event()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def on_sidebar_button_1_click(self):
+        folder_path = self.entry.get()
+        if not os.path.exists(folder_path):
+            self.textbox_2.delete("0.0", tkinter.END)
+            self.textbox_2.insert("0.0", "Please select a folder path\n\n")
+            return
+        name_settings = self.get_name_settings()  # read on the main thread, the worker must not touch widgets
+
+        def process_files():
+            _, entries = scan_folder(folder_path)
+            progress_updater = ProgressUpdater(self, len(entries))
+
+            date_cache = DateCache()
+            try:
+                items = gather_dates(entries, date_cache, progress_updater.update, self.metadata_batcher, self.stop_event)
+                if self.stop_event.is_set():
+                    return  # the dates are incomplete, don't rename with them
+                files_without_metadata = [item.name for item in items if item.dt is None]
+                renamed_files = run_renames(plan_renames(items, name_settings), date_cache, self.stop_event)
+            finally:
+                date_cache.close()
+
+            self.post(self.show_rename_results, renamed_files, files_without_metadata)
+
+        self.run_in_background(process_files)
+
+    def show_rename_results(self, renamed_files, files_without_metadata):
+        self.preview_items = None  # the previewed files have new names now
+        # the report is built as one string, an insert per file makes Tk lay out the text once per line
+        report = []
+
+        def list_names(names):
+            report.extend(f"-> File: {name}\n" for name in names[:REPORT_NAME_LIMIT])
+            if len(names) > REPORT_NAME_LIMIT:
+                report.append(f"-> ... and {len(names) - REPORT_NAME_LIMIT} more\n")
+
+        if len(files_without_metadata) > 0:
+            report.append("\n\nFiles without Metadata have not been renamed:\n")
+            list_names(files_without_metadata)
+
+        if len(renamed_files) > 0 or len(files_without_metadata) == 0:
+            report.append("\n\nRename Successfully:\n")
+            list_names(renamed_files)
+        self.textbox_2.delete("3.0", tkinter.END)
+        self.textbox_2.insert(tkinter.END, "".join(report))
+
+    def update_preview(self, rescan=True):
+        folder_path = self.entry.get()
+        # a naming change during the scan of the folder waits for it, the plan then reads the current options
+        if not rescan and self.preview_scan is not None and self.preview_scan[0] == folder_path:
+            return
+        self.preview_seq += 1
+        seq = self.preview_seq
+        folder_stat = self.stat_folder(folder_path)
+        if folder_stat is None:
+            self.cancel_preview_scan()
+            self.set_preview_text("Please select a folder path\n\n")
+            return
+        # naming changes only need a new plan, the dates of the folder are already known
+        # as long as no file was added, removed or renamed since the scan
+        if (not rescan and self.preview_items is not None and self.preview_folder == folder_path
+                and folder_stat.st_mtime_ns == self.preview_folder_mtime):
+            self.show_preview(self.preview_items, self.preview_taken_names)
+            return
+
+        self.cancel_preview_scan()
+        cancel_event = threading.Event()
+        self.preview_scan = (folder_path, cancel_event)
+
+        def parse_files():
+            try:
+                folder_mtime, entries = scan_folder(folder_path)
+                date_cache = DateCache()
+                try:
+                    items = gather_dates(entries, date_cache, batcher=self.metadata_batcher, stop_event=cancel_event)
+                finally:
+                    date_cache.close()
+                if cancel_event.is_set():
+                    return  # replaced by a newer scan or the window closed, the dates are incomplete
+                taken_names = get_taken_names(items)
+                self.post(self.on_preview_parsed, seq, folder_path, folder_mtime, items, taken_names)
+            except Exception as e:
+                self.post(self.textbox_2.insert, "0.0", f"Error: {str(e)}\n\n")
+            finally:
+                self.post(self.on_preview_scan_done, cancel_event)
+
+        self.run_in_background(parse_files)
+
+    # function to stop the preview scan in progress, its files not read yet are skipped
+    def cancel_preview_scan(self):
+        if self.preview_scan is not None:
+            self.preview_scan[1].set()
+            self.preview_scan = None
+
+    def on_preview_scan_done(self, cancel_event):
+        if self.preview_scan is not None and self.preview_scan[1] is cancel_event:
+            self.preview_scan = None
+
+    def on_preview_parsed(self, seq, folder_path, folder_mtime, items, taken_names):
+        if seq != self.preview_seq:  # another folder or scan was started meanwhile
+            return
+        self.preview_folder = folder_path
+        self.preview_folder_mtime = folder_mtime
+        self.preview_items = items
+        self.preview_taken_names = taken_names
+        self.show_preview(items, taken_names)
+
+    # function to stat the preview folder, reused for a moment since a slow drive would block the window on every naming change
+    def stat_folder(self, folder_path):
+        now = time.monotonic()
+        if self.folder_stat_cache is not None:
+            cached_path, cached_time, cached_stat = self.folder_stat_cache
+            if cached_path == folder_path and now - cached_time < FOLDER_STAT_TTL:
+                return cached_stat
+        try:
+            folder_stat = os.stat(folder_path)
+        except (OSError, ValueError):
+            folder_stat = None
+        self.folder_stat_cache = (folder_path, now, folder_stat)
+        return folder_stat
+
+    # the prefix/suffix fields fire on every key, the preview is re-planned once typing pauses
+    def schedule_naming_update(self):
+        if self.naming_update_job is not None:
+            self.after_cancel(self.naming_update_job)
+        self.naming_update_job = self.after(NAMING_DEBOUNCE_MS, self.run_naming_update)
+
+    def run_naming_update(self):
+        self.naming_update_job = None
+        # keys that don't edit the text (arrows, shift, ...) leave the naming options as they are
+        if self.preview_items is not None and self.get_naming_key() == self.preview_naming_key:
+            return
+        self.update_preview(rescan=False)
+
+    # function to plan the preview on a worker thread, the naming options are read here on the Tk thread
+    def show_preview(self, items, taken_names):
+        self.preview_naming_key = self.get_naming_key()
+        self.preview_seq += 1
+        seq = self.preview_seq
+        name_settings = self.get_name_settings()
+
+        def plan_preview():
+            try:
+                # same plan as the rename, so the preview shows the numbered names too
+                plan = plan_renames(items, name_settings, limit=50, taken_names=taken_names)
+                self.post(self.on_preview_planned, seq, plan)
+            except Exception as e:
+                self.post(self.textbox_2.insert, "0.0", f"Error: {str(e)}\n\n")
+
+        self.run_in_background(plan_preview)
+
+    def on_preview_planned(self, seq, plan):
+        if seq != self.preview_seq:  # the naming options changed again while this plan ran
+            return
+        lines = [f"{item.name} -> {new_name}\n" for item, new_name in plan]
+        self.set_preview_text("Preview of Files (0-49):\n\n" + "".join(lines))
+
+    # function to replace the preview text in one insert, e.g. a prefix typed and deleted again leaves the box as it is
+    def set_preview_text(self, text):
+        if text == self.preview_text:
+            return
+        self.preview_text = text
+        self.textbox_3.delete("0.0", tkinter.END)
+        self.textbox_3.insert("0.0", text)
+
+    def get_naming_key(self):
+        return self.combobox_1.get(), self.entry_2.get(), self.entry_3.get(), self.radio_var.get()
+
+    # function to read the naming options once per batch, widget reads go through the Tcl interpreter
+    def get_name_settings(self):
+        return get_formatter(self.combobox_1.get()), self.entry_2.get(), self.entry_3.get(), self.radio_var.get()
+
+    # function to run a task on the background threads, an error it doesn't handle itself is shown like the others
+    def run_in_background(self, task):
+        future = self.background_executor.submit(task)
+        future.add_done_callback(self.report_task_error)
+
+    def report_task_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.post(self.textbox_2.insert, "0.0", f"Error: {str(future.exception())}\n\n")
+
+    # function to run a widget update on the Tk main thread, safe to call from worker threads
+    def post(self, callback, *args):
+        self.ui_queue.put((callback, args))
+
+    def drain_ui_queue(self):
+        pending = []
+        while True:
+            try:
+                pending.append(self.ui_queue.get_nowait())
+            except queue.Empty:
+                break
+        # a progress text replaces the previous one, so only the newest of the batch is drawn
+        last_progress = None
+        for index, (callback, args) in enumerate(pending):
+            if callback == self.update_textbox_2:
+                last_progress = index
+        try:
+            for index, (callback, args) in enumerate(pending):
+                if callback == self.update_textbox_2 and index != last_progress:
+                    continue
+                try:
+                    callback(*args)
+                except Exception as e:  # one failed update must not hold back the ones after it
+                    self.textbox_2.insert("0.0", f"Error: {str(e)}\n\n")
+        finally:
+            self.after(100, self.drain_ui_queue)  # keep draining even if showing an error failed too
+
+    def update_textbox_2(self, progress_text):
+        self.textbox_2.delete("0.0", tkinter.END)
+        self.textbox_2.insert("0.0", progress_text)
+
+    def browse_directory(self):
+        folder_path = tkinter.filedialog.askdirectory()
+        self.entry.delete(0, tkinter.END)
+        self.entry.insert(0, folder_path)
+        self.folder_stat_cache = None
+        # picking the previewed folder again keeps its scan, update_preview still rescans if the folder changed
+        if folder_path and folder_path == self.preview_folder and self.preview_items is not None:
+            self.update_preview(rescan=False)
+            return
+        parse_cache.clear()
+        self.preview_items = None
+        self.update_preview()
+
+    def open_input_dialog_event(self):
+        dialog = customtkinter.CTkInputDialog(text="Type in a number:", title="CTkInputDialog")
+        print("CTkInputDialog:", dialog.get_input())
+
+    def change_appearance_mode_event(self, new_appearance_mode: str):
+        if new_appearance_mode == self.appearance_mode:
+            return
+        self.appearance_mode = new_appearance_mode
+        customtkinter.set_appearance_mode(new_appearance_mode)
+
+    def change_scaling_event(self, new_scaling: str):
+        new_scaling_float = int(new_scaling.replace("%", "")) / 100
+        if new_scaling_float == self.widget_scaling:
+            return
+        self.widget_scaling = new_scaling_float
+        customtkinter.set_widget_scaling(new_scaling_float)
+
+    def sidebar_button_event(self):
+        pass
+
+    def on_closing(self):
+        self.stop_event.set()
+        self.cancel_preview_scan()
+        self.background_executor.shutdown(wait=False, cancel_futures=True)
+        self.metadata_batcher.close()
+        self.destroy()
+
+class ProgressUpdater:
+    def __init__(self, app, total, prefix="", suffix="", decimals=1, length=25, fill='█', print_end="\r"):
+        self.app = app
+        self.total = total
+        self.prefix = prefix
+        self.suffix = suffix
+        self.decimals = decimals
+        self.length = length
+        self.fill = fill
+        self.print_end = print_end
+        self.progress = 0
+        # redraw at most every step items (~200 redraws per batch) and not more often than every 50 ms
+        self.step = max(1, total // 200)
+        self.min_interval = 0.05
+        self.last_redraw = 0.0
+        self.last_text = None
+
+    def update(self, progress):
+        self.progress = progress
+        now = time.monotonic()
+        if progress < self.total and (progress % self.step or now - self.last_redraw < self.min_interval):
+            return
+        self.last_redraw = now
+        percent = ("{0:." + str(self.decimals) + "f}").format(100 * (progress / float(self.total)))
+        filled_length = int(self.length * progress // self.total)
+        bar = self.fill * filled_length + '-' * (self.length - filled_length)
+        progress_text = f"{self.prefix} |{bar}| {percent}% {self.suffix}"
+        if progress_text == self.last_text:
+            return  # same percentage and bar as the last redraw
+        self.last_text = progress_text
+        self.app.post(self.app.update_textbox_2, progress_text)